@@ -1,3 +1,9 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import CorrectionBatch
+
+
+@admin.register(CorrectionBatch)
+class CorrectionBatchAdmin(admin.ModelAdmin):
+    list_display = ("openai_batch_id", "user", "status", "created_at")
+    list_filter = ("status",)
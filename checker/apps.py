@@ -1,6 +1,13 @@
+import atexit
+
 from django.apps import AppConfig
 
 
 class CheckerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'checker'
+
+    def ready(self):
+        # Close the shared OpenAI HTTP pool when the worker process exits
+        from . import views
+        atexit.register(views.close_openai_client)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from checker.models import CorrectionBatch
+from checker.views import refresh_correction_batch
+
+
+class Command(BaseCommand):
+    help = "Poll OpenAI for unfinished bulk corrections and store finished results (run from cron)."
+
+    def handle(self, *args, **options):
+        pending = CorrectionBatch.objects.exclude(status__in=CorrectionBatch.FINAL_STATUSES)
+        for batch in pending:
+            try:
+                batch = refresh_correction_batch(batch)
+            except Exception as e:
+                self.stderr.write(f"❌ {batch.openai_batch_id}: {e}")
+                continue
+            self.stdout.write(f"{batch.openai_batch_id}: {batch.status}")
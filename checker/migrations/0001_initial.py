@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-15 09:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorrectionBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('openai_batch_id', models.CharField(max_length=100, unique=True)),
+                ('status', models.CharField(default='validating', max_length=32)),
+                ('texts', models.JSONField()),
+                ('results', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='correction_batches', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -1,3 +1,30 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class CorrectionBatch(models.Model):
+    """
+    Bulk correction submitted through OpenAI's Batch API (half price, up to 24h).
+    `texts` is the submitted list; `results` is filled in once the batch is done.
+    """
+    # OpenAI batch statuses after which nothing changes any more
+    FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="correction_batches",
+    )
+    openai_batch_id = models.CharField(max_length=100, unique=True)
+    status = models.CharField(max_length=32, default="validating")
+    texts = models.JSONField()
+    results = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.openai_batch_id} ({self.status})"
+
+    @property
+    def is_final(self):
+        return self.status in self.FINAL_STATUSES
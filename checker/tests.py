@@ -1,3 +1,445 @@
-from django.test import TestCase
+import difflib
+import io
+import json
+import random
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from .models import CorrectionBatch
+from .views import (
+    build_correction_payload,
+    chunk_text_preserve,
+    comma_pass_if_needed,
+    correct_with_openai,
+    find_differences_charwise,
+    _needs_comma_pass,
+    keep_only_comma_changes,
+    myers_matching_blocks,
+    split_batch_answer,
+    token_opcodes,
+    tokens_with_spans,
+    undo_space_merges,
+)
+
+
+def _tokens(s):
+    return tokens_with_spans(s)[0]
+
+
+# Unchanged context around a short example, so token_opcodes takes the Myers path
+PADDING = (
+    "Igår gick jag till affären och köpte mjölk, bröd och smör. "
+    "Sedan cyklade jag hem genom parken där barnen lekte i sandlådan. "
+) * 3
+
+
+def _padded(s):
+    return PADDING + s + " " + PADDING.strip()
+
+
+def _apply(text, differences):
+    out = text
+    for d in sorted(differences, key=lambda d: d["start"], reverse=True):
+        out = out[:d["start"]] + d["suggestion"] + out[d["end"]:]
+    return out
+
+
+class TokenOpcodesTests(SimpleTestCase):
+    def assert_valid_opcodes(self, a, b, opcodes):
+        i = j = 0
+        for tag, i1, i2, j1, j2 in opcodes:
+            self.assertEqual((i1, j1), (i, j))
+            if tag == "equal":
+                self.assertEqual(a[i1:i2], b[j1:j2])
+            i, j = i2, j2
+        self.assertEqual((i, j), (len(a), len(b)))
+
+    def test_opcodes_cover_both_sequences(self):
+        rng = random.Random(0)
+        words = "vi är om du med och att det som en".split()
+        for _ in range(500):
+            a = [rng.choice(words) for _ in range(rng.randint(0, 40))]
+            b = list(a)
+            for _ in range(rng.randint(0, 4)):
+                p = rng.randrange(len(b) + 1)
+                r = rng.random()
+                if r < 0.4:
+                    b.insert(p, ",")
+                elif p < len(b) - 1 and r < 0.7:
+                    b[p:p + 2] = [b[p] + b[p + 1]]
+                elif p < len(b):
+                    b[p] = b[p] + "x"
+            self.assert_valid_opcodes(a, b, token_opcodes(a, b))
+
+    def test_spelling_fixes_only_match_difflib(self):
+        a = _tokens("Jag tycker att de var en bra ide.")
+        b = _tokens("Jag tycker att det var en bra idé.")
+        self.assertEqual(
+            token_opcodes(a, b),
+            difflib.SequenceMatcher(a=a, b=b, autojunk=False).get_opcodes(),
+        )
+
+    def test_fast_path_matches_difflib(self):
+        # Same length, spelling fixes only: the parallel walk must give difflib's opcodes
+        rng = random.Random(1)
+        words = "jag du han hon det att och som en på".split()
+        for _ in range(500):
+            a = [rng.choice(words) for _ in range(rng.randint(1, 40))]
+            b = [w + "e" if rng.random() < 0.2 else w for w in a]
+            self.assertEqual(
+                token_opcodes(a, b),
+                difflib.SequenceMatcher(a=a, b=b, autojunk=False).get_opcodes(),
+            )
+
+    def test_myers_stops_past_max_d(self):
+        self.assertIsNone(myers_matching_blocks(list("abcd"), list("wxyz"), max_d=3))
+        self.assertEqual(myers_matching_blocks(list("abc"), list("abc"), max_d=0), [(0, 0, 3)])
+
+    def test_merge_next_to_repeated_word_is_one_replace(self):
+        cases = [
+            # two-letter words: the stray delete would at least be reported on its own
+            ("Jag tror att vi är är om om du kan komma med och.",
+             "Jag tror att vi är ärom om du kan komma med, och.",
+             "är om", "ärom"),
+            # longer words: a lone delete isn't reported, so it must stay in the replace
+            ("Vi tog en bil hus hus sol där och åkte hem till mor far igen.",
+             "Vi tog en bilhus hus sol där och åkte hem till mor, far igen.",
+             "bil hus", "bilhus"),
+            ("Det var sol där sol sol där och sedan hem till mor far igen.",
+             "Det var soldär sol sol, där och sedan hem till mor far, igen.",
+             "sol där", "soldär"),
+        ]
+        for original, corrected, merged_from, merged_to in cases:
+            with self.subTest(original=original):
+                original, corrected = _padded(original), _padded(corrected)
+                a, b = _tokens(original), _tokens(corrected)
+                self.assert_valid_opcodes(a, b, token_opcodes(a, b))
+                diffs = find_differences_charwise(original, corrected)
+                self.assertIn((merged_from, merged_to), [(d["original"], d["suggestion"]) for d in diffs])
+                self.assertEqual(_apply(original, diffs), corrected)
+
+
+@mock.patch("checker.views.cache")
+class BuildCorrectionPayloadTests(SimpleTestCase):
+    def test_long_repetitive_text_keeps_its_differences(self, _cache):
+        # 585 tokens: past AUTOJUNK_MIN_TOKENS, where autojunk collapses the diff
+        original = "Det är ett stavfell här. Om du vill kan vi ses. " * 45
+        corrected = "Det är ett stavfel här. Om du vill, kan vi ses. " * 45
+        payload = build_correction_payload(original, corrected, "key")
+        self.assertEqual(payload["error_count"], 90)
+        self.assertEqual(
+            [(d["original"], d["suggestion"]) for d in payload["differences"][:2]],
+            [("stavfell", "stavfel"), ("vill kan", "vill, kan")],
+        )
+        self.assertEqual(_apply(original, payload["differences"]), corrected)
+
+    def test_unchanged_text_has_no_differences_and_is_not_cached(self, cache):
+        payload = build_correction_payload("Hej då.", "Hej då.", "key")
+        self.assertEqual(payload["differences"], [])
+        cache.set.assert_not_called()
+
+
+def _chat_response(content):
+    return mock.Mock(choices=[mock.Mock(message=mock.Mock(content=content))])
+
+
+@mock.patch("checker.views.cache")
+@mock.patch("checker.views.client")
+class CorrectWithOpenAITests(SimpleTestCase):
+    text = "Om du vill kan vi ses imorgon."
+
+    def answer(self, client, spelling_fixed, with_commas):
+        client.chat.completions.create.return_value = _chat_response(
+            json.dumps({"spelling_fixed": spelling_fixed, "with_commas": with_commas})
+        )
+
+    def test_comma_fix_only_in_with_commas_is_kept(self, client, cache):
+        cache.get.return_value = None
+        self.answer(client, self.text, "Om du vill, kan vi ses imorgon.")
+        self.assertEqual(correct_with_openai(self.text), "Om du vill, kan vi ses imorgon.")
+        client.chat.completions.create.assert_called_once()
+        cache.set.assert_called_once()
+
+    def test_unchanged_answer_falls_back_uncached(self, client, cache):
+        cache.get.return_value = None
+        self.answer(client, self.text, self.text)
+        self.assertEqual(correct_with_openai(self.text), self.text)
+        cache.set.assert_not_called()
+
+
+class UndoSpaceMergesTests(SimpleTestCase):
+    def test_word_merge_is_undone(self):
+        self.assertEqual(
+            undo_space_merges("Jag värnar om mitt privat livet.", "Jag värnar om mitt privatlivet."),
+            "Jag värnar om mitt privat livet.",
+        )
+
+    def test_split_word_is_undone(self):
+        self.assertEqual(
+            undo_space_merges("Han bor i Stock holm.", "Han bor i Stockholm."),
+            "Han bor i Stock holm.",
+        )
+
+    def test_hyphenation_is_kept(self):
+        self.assertEqual(
+            undo_space_merges("Skicka ett e - post till mig.", "Skicka ett e-post till mig."),
+            "Skicka ett e-post till mig.",
+        )
+
+    def test_other_corrections_are_kept(self):
+        self.assertEqual(
+            undo_space_merges("Om du vill kan vi ses imorrgon", "Om du vill, kan vi ses imorgon."),
+            "Om du vill, kan vi ses imorgon.",
+        )
+
+    def test_repetitive_text(self):
+        self.assertEqual(undo_space_merges("och och och och och och", "ochoch och och och och"), "och och och och och och")
+        self.assertEqual(undo_space_merges("vi vi vi vi vi vi vi vi.", "vi vi vivi vi vi, vi."), "vi vi vi vi vi vi, vi.")
+
+
+class KeepOnlyCommaChangesTests(SimpleTestCase):
+    def test_comma_insert_is_kept(self):
+        self.assertEqual(
+            keep_only_comma_changes("Om du vill kan vi ses.", "Om du vill, kan vi ses."),
+            "Om du vill, kan vi ses.",
+        )
+
+    def test_comma_removal_is_kept(self):
+        self.assertEqual(
+            keep_only_comma_changes("Jag tror, att det regnar.", "Jag tror att det regnar."),
+            "Jag tror att det regnar.",
+        )
+
+    def test_word_change_is_reverted_nearby_comma_kept(self):
+        self.assertEqual(
+            keep_only_comma_changes("Om du vill kan vi ses imorrgon.", "Om du vill, kan vi träffas imorgon."),
+            "Om du vill, kan vi ses imorrgon.",
+        )
+
+    def test_whitespace_merge_away_from_comma_is_rejected(self):
+        self.assertEqual(
+            keep_only_comma_changes("Om du vill kan vi ses i morgon.", "Om du vill, kan vi ses imorgon."),
+            "Om du vill, kan vi ses i morgon.",
+        )
+        self.assertEqual(
+            keep_only_comma_changes("Jag värnar om mitt privat liv.", "Jag värnar om mitt privatliv."),
+            "Jag värnar om mitt privat liv.",
+        )
+
+    def test_comma_attached_to_a_rewritten_word_is_dropped(self):
+        self.assertEqual(
+            keep_only_comma_changes("Hon sa att han kom.", "Hon sa att hann, kom."),
+            "Hon sa att han kom.",
+        )
+
+
+class NeedsCommaPassTests(SimpleTestCase):
+    def test_clause_opener(self):
+        self.assertTrue(_needs_comma_pass("Om du vill kan vi ses."))
+        self.assertTrue(_needs_comma_pass("För att komma dit tar vi bussen."))
+
+    def test_men(self):
+        self.assertTrue(_needs_comma_pass("Jag ville gå ut men det regnade."))
+
+    def test_long_och_eller_sentence(self):
+        self.assertTrue(_needs_comma_pass("Jag gick till affären och hon stannade hemma idag."))
+        self.assertTrue(_needs_comma_pass("Du kan ta bussen till stan eller jag kör dig dit."))
+        # "och" between two words of a short sentence needs no comma
+        self.assertFalse(_needs_comma_pass("Jag och du går hem."))
+
+    def test_sentence_under_four_words(self):
+        self.assertFalse(_needs_comma_pass("Om du vill."))
+
+    def test_sentence_with_a_comma(self):
+        self.assertFalse(_needs_comma_pass("Om du vill, kan vi ses."))
+
+    def test_only_the_sentence_without_a_comma_counts(self):
+        self.assertTrue(_needs_comma_pass("Om du vill, kan vi ses. Om det regnar stannar vi inne."))
+        self.assertFalse(_needs_comma_pass("Vi ses imorgon bitti hemma. Om du vill, kan vi äta."))
+
+    @mock.patch("checker.views.comma_pass", return_value=("Vi ses, hemma.", True))
+    def test_comma_pass_if_needed(self, comma_pass):
+        # Nothing looks missing and the input had commas: the call is skipped
+        self.assertEqual(
+            comma_pass_if_needed("Ja, vi ses hemma.", "Ja, vi ses hemma."),
+            ("Ja, vi ses hemma.", True),
+        )
+        comma_pass.assert_not_called()
+
+        # Input typed without any commas always gets the pass
+        self.assertEqual(comma_pass_if_needed("Vi ses hemma.", "Vi ses hemma."), ("Vi ses, hemma.", True))
+        comma_pass.assert_called_once_with("Vi ses hemma.")
+
+        # The heuristic firing on the corrected text also runs it
+        comma_pass.reset_mock()
+        comma_pass_if_needed("Ja, om du vill kan vi ses.", "Ja. Om du vill kan vi ses.")
+        comma_pass.assert_called_once_with("Ja. Om du vill kan vi ses.")
+
+
+class SplitBatchAnswerTests(SimpleTestCase):
+    def test_segments_in_order(self):
+        self.assertEqual(split_batch_answer("### 0\nHej.\n### 1\nDå.\n", 2), ["Hej.\n", "Då.\n"])
+
+    def test_marker_without_space(self):
+        self.assertEqual(split_batch_answer("###0\nHej.\n###1\nDå.", 2), ["Hej.\n", "Då."])
+
+    def test_broken_framing_returns_none(self):
+        for answer in (
+            "### 0\nHej.\n### 2\nDå.",  # skipped number
+            "### 1\nDå.\n### 0\nHej.",  # reordered
+            "### 0\nHej.",  # missing text
+            "Här är texterna:\n### 0\nHej.\n### 1\nDå.",  # text before the first marker
+            "Hej. Då.",  # no markers
+            "",
+            None,
+        ):
+            with self.subTest(answer=answer):
+                self.assertIsNone(split_batch_answer(answer, 2))
+
+
+class ChunkTextPreserveTests(SimpleTestCase):
+    def test_chunks_rejoin_to_the_text(self):
+        text = "Första meningen. Andra meningen! Tredje?\n\nNytt stycke här. " + "x" * 50
+        chunks = chunk_text_preserve(text, max_chars=20)
+        self.assertEqual("".join(chunks), text)
+        self.assertTrue(all(len(c) <= 20 for c in chunks))
+        self.assertEqual(chunks[:4], ["Första meningen. ", "Andra meningen! ", "Tredje?\n\n", "Nytt stycke här. "])
+
+    def test_sentences_are_packed_up_to_max_chars(self):
+        text = "Ett. Två. Tre. Fyra. Fem."
+        self.assertEqual(chunk_text_preserve(text, max_chars=10), ["Ett. Två. ", "Tre. ", "Fyra. Fem."])
+
+    def test_empty_text(self):
+        self.assertEqual(chunk_text_preserve(""), [""])
+
+
+def _batch_output(*rows):
+    return mock.Mock(text="\n".join(json.dumps(row) for row in rows) + "\n")
+
+
+@mock.patch("checker.views.client")
+class SubmitBatchTests(TestCase):
+    def setUp(self):
+        self.url = reverse("correct_bulk")
+        self.user = User.objects.create_user("anna", password="hemligt123")
+        self.client.force_login(self.user)
+
+    def post_texts(self, texts):
+        return self.client.post(self.url, data=json.dumps({"texts": texts}), content_type="application/json")
+
+    def test_submit(self, openai):
+        openai.files.create.return_value = mock.Mock(id="file-1")
+        openai.batches.create.return_value = mock.Mock(id="batch_1", status="validating")
+
+        response = self.post_texts(["Jag har ett stavfell.", "Hej\u00a0då."])
+
+        self.assertEqual(response.status_code, 202)
+        batch = CorrectionBatch.objects.get()
+        self.assertEqual(response.json(), {"id": batch.pk, "status": "validating", "results": None})
+        self.assertEqual((batch.user, batch.openai_batch_id), (self.user, "batch_1"))
+        self.assertEqual(batch.texts, ["Jag har ett stavfell.", "Hej då."])
+        self.assertEqual(openai.batches.create.call_args.kwargs["input_file_id"], "file-1")
+
+    def test_login_required(self, openai):
+        self.client.logout()
+        self.assertEqual(self.post_texts(["Hej."]).status_code, 401)
+        openai.files.create.assert_not_called()
+
+    def test_post_only(self, openai):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+    def test_bad_body(self, openai):
+        for body in ("inte json", json.dumps({}), json.dumps({"texts": []}), json.dumps({"texts": ["Hej.", 3]})):
+            with self.subTest(body=body):
+                response = self.client.post(self.url, data=body, content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+        openai.files.create.assert_not_called()
+
+    def test_too_many_texts(self, openai):
+        self.assertEqual(self.post_texts(["Hej."] * 101).status_code, 413)
+        openai.files.create.assert_not_called()
+
+    def test_too_long_text(self, openai):
+        self.assertEqual(self.post_texts(["Hej.", "a" * 8001]).status_code, 413)
+        openai.files.create.assert_not_called()
+
+    def test_openai_error(self, openai):
+        openai.files.create.side_effect = RuntimeError("down")
+        response = self.post_texts(["Hej."])
+        self.assertEqual(response.status_code, 502)
+        self.assertFalse(CorrectionBatch.objects.exists())
+
+
+@mock.patch("checker.views.client")
+class BatchStatusTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("anna", password="hemligt123")
+        self.client.force_login(self.user)
+        self.batch = CorrectionBatch.objects.create(
+            user=self.user,
+            openai_batch_id="batch_1",
+            status="in_progress",
+            texts=["Jag har ett stavfell.", "Vi ses imorgon."],
+        )
+        self.url = reverse("correct_bulk_status", args=[self.batch.pk])
+
+    def test_in_progress(self, openai):
+        openai.batches.retrieve.return_value = mock.Mock(status="in_progress", output_file_id=None)
+        response = self.client.get(self.url)
+        self.assertEqual(response.json(), {"id": self.batch.pk, "status": "in_progress", "results": None})
+
+    def test_completed_with_a_failed_request(self, openai):
+        openai.batches.retrieve.return_value = mock.Mock(status="completed", output_file_id="file-out")
+        openai.files.content.return_value = _batch_output(
+            {"custom_id": "0", "response": {"body": {"choices": [{"message": {"content": "Jag har ett stavfel."}}]}}},
+            {"custom_id": "1", "response": None, "error": {"message": "server_error"}},
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()["status"], "completed")
+        self.assertEqual(response.json()["results"], ["Jag har ett stavfel.", "Vi ses imorgon."])
+        openai.files.content.assert_called_once_with("file-out")
+
+    def test_completed_without_output_file(self, openai):
+        # Every request failed: the texts come back unchanged, and the batch is final
+        openai.batches.retrieve.return_value = mock.Mock(status="completed", output_file_id=None)
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()["results"], self.batch.texts)
+        openai.files.content.assert_not_called()
+
+        self.client.get(self.url)
+        openai.batches.retrieve.assert_called_once()
+
+    def test_openai_error(self, openai):
+        openai.batches.retrieve.side_effect = RuntimeError("down")
+        self.assertEqual(self.client.get(self.url).status_code, 502)
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.status, "in_progress")
+
+    def test_other_users_batch_is_not_found(self, openai):
+        other = User.objects.create_user("bertil", password="hemligt123")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        openai.batches.retrieve.assert_not_called()
+
+    def test_login_required(self, openai):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+@mock.patch("checker.views.client")
+class PollCorrectionBatchesTests(TestCase):
+    def test_polls_only_unfinished_batches(self, openai):
+        user = User.objects.create_user("anna", password="hemligt123")
+        pending = CorrectionBatch.objects.create(user=user, openai_batch_id="batch_1", status="in_progress", texts=["Hej."])
+        CorrectionBatch.objects.create(user=user, openai_batch_id="batch_2", status="completed", texts=["Hej."], results=["Hej."])
+        openai.batches.retrieve.return_value = mock.Mock(status="finalizing", output_file_id=None)
+
+        call_command("poll_correction_batches", stdout=io.StringIO(), stderr=io.StringIO())
+
+        openai.batches.retrieve.assert_called_once_with("batch_1")
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, "finalizing")
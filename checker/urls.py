@@ -6,5 +6,7 @@ urlpatterns = [
     path("login/", views.login_view, name="login"),
     path("register/", views.register, name="register"),
     path("logout/", views.logout_view, name="logout"),
+    path("correct_bulk/", views.submit_batch, name="correct_bulk"),
+    path("correct_bulk/<int:pk>/", views.batch_status, name="correct_bulk_status"),
 
 ]
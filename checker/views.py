@@ -1,10 +1,32 @@
-from django.shortcuts import render, redirect
-from django.http import JsonResponse
-from openai import OpenAI
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.cache import cache
+from openai import OpenAI, DefaultHttpxClient
+import httpx
+from rapidfuzz.distance import Indel, Levenshtein
 import os
 import re
+import ssl
 import difflib
+import hashlib
+import itertools
+import json
 import unicodedata
+from array import array
+from collections import Counter
+from operator import itemgetter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .models import CorrectionBatch
+
+
+def _nfc(s: str) -> str:
+    # normalize() already returns `s` itself (no copy) when its NFC quick-check passes,
+    # so there is nothing to gain from an is_normalized() pre-check — it is slower.
+    # ASCII is always NFC; isascii() is a flag read, so skip the call entirely.
+    s = s or ""
+    return s if s.isascii() else unicodedata.normalize("NFC", s)
+
 
 # --- Paste normalization (Google Docs, Word, etc.) ---
 ZERO_WIDTH_RE = re.compile(r"[\u200B\u200C\u200D\u2060\uFEFF]")  # ZWSP/ZWNJ/ZWJ/WJ/BOM
@@ -12,7 +34,10 @@ ZERO_WIDTH_RE = re.compile(r"[\u200B\u200C\u200D\u2060\uFEFF]")  # ZWSP/ZWNJ/ZWJ
 def normalize_pasted_text(s: str) -> str:
     if s is None:
         return ""
-    s = unicodedata.normalize("NFC", s)
+    s = _nfc(s)
+
+    # Chained str.replace on purpose: each is a memchr-speed scan that returns the same
+    # object when nothing matches. A str.translate table was ~5x slower on Swedish text.
 
     # Normalize all common "line break" variants to \n
     s = s.replace("\r\n", "\n").replace("\r", "\n")
@@ -32,7 +57,7 @@ WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)  # letters only (handles åäö)
 
 def extract_words(s: str):
     # "words" = sequences of letters only; punctuation/hyphens/spaces ignored
-    return WORD_RE.findall(unicodedata.normalize("NFC", s or ""))
+    return WORD_RE.findall(_nfc(s))
 
 def edit_distance_leq1(a: str, b: str) -> bool:
     """
@@ -44,33 +69,16 @@ def edit_distance_leq1(a: str, b: str) -> bool:
     if a == b:
         return True
 
-    la, lb = len(a), len(b)
-    if abs(la - lb) > 1:
+    if abs(len(a) - len(b)) > 1:
         return False
 
-    # Same length: at most 1 substitution
-    if la == lb:
-        mismatches = sum(1 for x, y in zip(a, b) if x != y)
-        return mismatches <= 1
+    # C++ Levenshtein (rapidfuzz); score_cutoff lets it stop as soon as distance > 1
+    return Levenshtein.distance(a, b, score_cutoff=1) <= 1
 
-    # Ensure a is the shorter
-    if la > lb:
-        a, b = b, a
-        la, lb = lb, la
 
-    # lb = la + 1: at most 1 insertion
-    i = j = 0
-    edits = 0
-    while i < la and j < lb:
-        if a[i] == b[j]:
-            i += 1
-            j += 1
-        else:
-            edits += 1
-            if edits > 1:
-                return False
-            j += 1  # skip one char in longer string
-    return True
+def similarity(a: str, b: str) -> float:
+    # Same 2*matches/total scale as difflib's ratio(), but C++ (rapidfuzz) instead of pure Python
+    return Indel.normalized_similarity(a, b)
 
 
 # Allow-list for common Swedish confusions that are NOT "synonyms"
@@ -89,36 +97,42 @@ def is_small_word_edit(a: str, b: str) -> bool:
     Rejects:
     - real rewrites/synonyms (low similarity / large changes)
     """
-    a0 = (a or "").lower()
-    b0 = (b or "").lower()
+    return is_small_lower_word_edit((a or "").lower(), (b or "").lower())
+
 
+def is_small_lower_word_edit(a0: str, b0: str) -> bool:
+    """is_small_word_edit for words the caller has already lower-cased."""
     if a0 == b0:
         return True
 
     if a0 in ALLOWED_WORD_SWAPS and b0 in ALLOWED_WORD_SWAPS[a0]:
         return True
 
-    maxlen = max(len(a0), len(b0))
+    la, lb = len(a0), len(b0)
+    maxlen = max(la, lb)
 
     # For short words, use edit distance (SequenceMatcher ratio is misleading here)
     if maxlen <= 4:
         return edit_distance_leq1(a0, b0)
 
     # For normal words, allow typical misspellings
-    if maxlen <= 4:
-        return edit_distance_leq1(a0, b0)
-    elif maxlen <= 7:
-        return difflib.SequenceMatcher(a=a0, b=b0).ratio() >= 0.85
-    else:
-        return difflib.SequenceMatcher(a=a0, b=b0).ratio() >= 0.90
+    threshold = 0.85 if maxlen <= 7 else 0.90
+
+    # Best possible score is when every char of the shorter word matches:
+    # 2*min/(la+lb). If even that misses, it's a rewrite — skip the similarity call.
+    if 2 * min(la, lb) < threshold * (la + lb):
+        return False
 
+    return similarity(a0, b0) >= threshold
 
 
-def violates_no_word_add_remove(original: str, corrected: str) -> bool:
+
+def violates_no_word_add_remove(original: str, corrected: str, original_words=None) -> bool:
     """
     True if model added/removed/replaced whole words (not just spelling).
+    `original_words` = extract_words(original), if the caller already has it.
     """
-    ow = extract_words(original)
+    ow = extract_words(original) if original_words is None else original_words
     cw = extract_words(corrected)
 
     # Added/removed words
@@ -141,8 +155,8 @@ def project_safe_word_corrections(original: str, corrected: str) -> str:
     - Applies ONLY 1-to-1 small spelling edits to existing words in the original text
     - Preserves original whitespace/punctuation exactly
     """
-    orig = unicodedata.normalize("NFC", original or "")
-    corr = unicodedata.normalize("NFC", corrected or "")
+    orig = _nfc(original)
+    corr = _nfc(corrected)
 
     orig_matches = list(WORD_RE.finditer(orig))
     corr_words = extract_words(corr)
@@ -151,11 +165,11 @@ def project_safe_word_corrections(original: str, corrected: str) -> str:
     if not orig_words or not corr_words:
         return original
 
-    sm = difflib.SequenceMatcher(
-        a=[w.lower() for w in orig_words],
-        b=[w.lower() for w in corr_words],
-        autojunk=False
-    )
+    # Lower-case once; reused for both matching and the small-edit check
+    orig_lower = [w.lower() for w in orig_words]
+    corr_lower = [w.lower() for w in corr_words]
+
+    sm = difflib.SequenceMatcher(a=orig_lower, b=corr_lower, autojunk=False)
 
     # Collect replacements as (start, end, new_word)
     reps = []
@@ -163,11 +177,9 @@ def project_safe_word_corrections(original: str, corrected: str) -> str:
         if tag != "replace":
             continue
         if (i2 - i1) == 1 and (j2 - j1) == 1:
-            a = orig_words[i1]
-            b = corr_words[j1]
-            if is_small_word_edit(a, b):  # spelling-level only
+            if is_small_lower_word_edit(orig_lower[i1], corr_lower[j1]):  # spelling-level only
                 m = orig_matches[i1]
-                reps.append((m.start(), m.end(), b))
+                reps.append((m.start(), m.end(), corr_words[j1]))
 
     if not reps:
         return original
@@ -184,8 +196,57 @@ def project_safe_word_corrections(original: str, corrected: str) -> str:
 # OPENAI CLIENT
 # =================================================
 
+# Chunks of a long text are corrected concurrently. The calls are network-bound,
+# so a small thread pool is enough to overlap the round-trips inside one request.
+CHUNK_POOL_WORKERS = 8
+CHUNK_POOL = ThreadPoolExecutor(max_workers=CHUNK_POOL_WORKERS, thread_name_prefix="openai-chunk")
+# Per request, at most this many of those calls run at once (see iter_bounded)
+MAX_CALLS_PER_REQUEST = 4
+
+# Streamed responses diff here so the corrected text can be sent before diffing
+DIFF_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="diff")
+
+GUNICORN_THREADS = int(os.getenv("GUNICORN_THREADS", "1"))
+
+# Opt-in (SPECULATIVE_STRICT_RETRY=1): start the strict retry together with the first call
+# for short texts, so a rejected first answer costs no extra round-trip. Off by default:
+# the retry is a full second gpt-4o call (STRICT_PROMPT + text + answer), and it is thrown
+# away whenever the first answer passes validation, which is almost always.
+SPECULATIVE_STRICT_RETRY = os.getenv("SPECULATIVE_STRICT_RETRY", "0") == "1"
+
+# Speculative strict retries (see _correct_with_openai): at most one per thread that runs
+# correct_with_openai. Its own pool, so a chunk worker never waits on CHUNK_POOL.
+RETRY_POOL_WORKERS = GUNICORN_THREADS + CHUNK_POOL_WORKERS if SPECULATIVE_STRICT_RETRY else 0
+RETRY_POOL = (
+    ThreadPoolExecutor(max_workers=RETRY_POOL_WORKERS, thread_name_prefix="openai-retry")
+    if SPECULATIVE_STRICT_RETRY else None
+)
+
+# Max OpenAI calls in flight per process: one per gunicorn thread (short texts are
+# corrected on the request thread), every CHUNK_POOL worker, and any speculative retries.
+# The HTTP pool below is sized so none of them waits for a free connection or reconnects cold.
+OPENAI_CONCURRENCY = GUNICORN_THREADS + CHUNK_POOL_WORKERS + RETRY_POOL_WORKERS
+
+# One client per process: building the SSL context reads the CA bundle from disk,
+# and a shared httpx pool keeps TLS connections alive between requests.
+# Never construct OpenAI() per request — always use `client` below.
+_SSL_CTX = ssl.create_default_context()
+_HTTP = DefaultHttpxClient(
+    verify=_SSL_CTX,
+    limits=httpx.Limits(
+        max_keepalive_connections=max(32, OPENAI_CONCURRENCY),
+        max_connections=max(64, OPENAI_CONCURRENCY),
+        keepalive_expiry=30,
+    ),
+)
+
 # Uses OPENAI_API_KEY from environment (systemd/gunicorn env or .env you load elsewhere)
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=_HTTP)
+
+
+def close_openai_client():
+    # Registered from CheckerConfig.ready() so the pool is closed on worker shutdown
+    _HTTP.close()
 
 
 # =================================================
@@ -193,6 +254,9 @@ client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 # =================================================
 
 
+# Sentence ends (terminators + following whitespace) and paragraph breaks
+SENTENCE_BOUNDARY_RE = re.compile(r"[.!?]+(?:\s+|$)|\n{2,}")
+
 def chunk_text_preserve(text: str, max_chars: int = 1800):
     """
     Split text i chunks (bevarar whitespace), så långa texter inte kollapsar till 0 diffs.
@@ -201,52 +265,173 @@ def chunk_text_preserve(text: str, max_chars: int = 1800):
     if not text:
         return [""]
 
-    # Split på meningar + större dubbla linjebryt, men behåll delimiters i output
-    units = re.findall(r".*?(?:[.!?]+(?:\s+|$)|\n{2,}|$)", text, flags=re.S)
-    units = [u for u in units if u]  # ta bort tomma
-
-    if not units:
-        units = [text]
+    # Split på meningar + större dubbla linjebryt, men behåll delimiters i output.
+    # Only the boundary ends are collected; units are sliced from them below.
+    ends = [m.end() for m in SENTENCE_BOUNDARY_RE.finditer(text)]
+    if not ends or ends[-1] != len(text):
+        ends.append(len(text))
 
     chunks = []
-    buf = ""
-    for u in units:
-        if len(buf) + len(u) <= max_chars:
-            buf += u
+    buf_start = buf_end = 0
+    for end in ends:
+        if end - buf_start <= max_chars:
+            buf_end = end
+            continue
+        if buf_end > buf_start:
+            chunks.append(text[buf_start:buf_end])
+        # Om en enskild unit är för stor, split hårt
+        if end - buf_end > max_chars:
+            for i in range(buf_end, end, max_chars):
+                chunks.append(text[i:min(i + max_chars, end)])
+            buf_start = buf_end = end
         else:
-            if buf:
-                chunks.append(buf)
-                buf = ""
-            # Om en enskild unit är för stor, split hårt
-            if len(u) > max_chars:
-                for i in range(0, len(u), max_chars):
-                    chunks.append(u[i:i + max_chars])
-            else:
-                buf = u
+            buf_start, buf_end = buf_end, end
 
-    if buf:
-        chunks.append(buf)
+    if buf_end > buf_start:
+        chunks.append(text[buf_start:buf_end])
 
     return chunks
 
 
-def correct_with_openai_chunked(text: str, max_chars: int = 1800) -> str:
+def iter_correct_with_openai_chunked(text: str, max_chars: int = 1800):
     """
     Kör korrektur i chunks för långa texter.
+    Chunkarna är oberoende: de batchas ihop i första passet och körs parallellt.
+    Yields (chunk_index, original_chunk, corrected_chunk) as chunks finish.
     """
     parts = chunk_text_preserve(text, max_chars=max_chars)
-    out = []
-    for p in parts:
-        if p.strip():
-            out.append(correct_with_openai(p))
-        else:
-            out.append(p)
-    return "".join(out)
+    todo = [i for i, p in enumerate(parts) if p.strip()]
+    for k, corrected in iter_correct_with_openai_batch([parts[i] for i in todo]):
+        yield todo[k], parts[todo[k]], corrected
+
+
+# Identical texts (resubmits, classroom exercises) skip OpenAI entirely
+CORRECTION_CACHE_TIMEOUT = 60 * 60 * 24
+# Bump when prompts or the safety net change, so old answers aren't served after a deploy
+CORRECTION_CACHE_VERSION = 3
+
+
+def correction_cache_key(text: str) -> str:
+    return f"sv:v{CORRECTION_CACHE_VERSION}:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def llm_cache_key(kind: str, text: str) -> str:
+    # Per-call results ("fix" = full correction, "comma" = comma pass), also per chunk
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=20).hexdigest()
+    return f"sv:{kind}:v{CORRECTION_CACHE_VERSION}:{digest}"
+
+
+def build_correction_payload(text: str, corrected_text: str, cache_key: str) -> dict:
+    # Tokens + opcodes are computed once and shared by both diff passes
+    prepared = prepare_diff(text, corrected_text)
+
+    # Normal diff (stram)
+    differences = find_differences_charwise(text, corrected_text, prepared=prepared)
+
+    # ✅ Om det FINNS ändringar men 0 diffs (typiskt vid långa texter / många kommatecken)
+    if not differences and corrected_text.strip() != text.strip():
+        # Past AUTOJUNK_MIN_TOKENS the shared opcodes may have junked every frequent
+        # token into one huge "replace"; the relaxed pass diffs without autojunk
+        _, _, orig_tokens, _, corr_tokens, _, _ = prepared
+        if max(len(orig_tokens), len(corr_tokens)) > AUTOJUNK_MIN_TOKENS:
+            prepared = prepare_diff(text, corrected_text, autojunk=False)
+        differences = find_differences_charwise(
+            text,
+            corrected_text,
+            max_block_tokens=80,
+            max_block_chars=1200,
+            max_diffs=300,
+            prepared=prepared,
+        )
+
+    payload = {
+        "original_text": text,
+        "corrected_text": corrected_text,
+        "differences": differences,
+        "error_count": len(differences),
+    }
+    # Unchanged output is also what an OpenAI error falls back to — don't pin that
+    if corrected_text != text:
+        cache.set(cache_key, payload, timeout=CORRECTION_CACHE_TIMEOUT)
+    return payload
+
+
+def correction_events(text: str, cache_key: str, streamed: bool = True):
+    """
+    Yields (event, data) for the streaming response:
+    one "chunk" per finished chunk of a long text, the full "corrected" text,
+    then the "result" payload with differences.
+    Corrections are only streamed once they have passed validation + comma pass,
+    so chunks (not raw model tokens) are the smallest unit sent.
+    A chunk's "differences" are relative to the chunk; add its "offset" for positions
+    in the whole text. The final "result" is authoritative.
+    `streamed=False` is for callers that only want "result": per-chunk diffs are
+    skipped, and the final diff runs on the calling thread (no DIFF_POOL hop).
+    """
+    # ✅ Chunk correction när texten är lång
+    if len(text) > 2000:
+        out = chunk_text_preserve(text, max_chars=1800)
+        offsets = [0, *itertools.accumulate(map(len, out))]
+        for i, original, corrected in iter_correct_with_openai_chunked(text, max_chars=1800):
+            out[i] = corrected
+            yield "chunk", {
+                "chunk_index": i,
+                "offset": offsets[i],
+                "original": original,
+                "corrected": corrected,
+                "differences": find_differences_charwise(original, corrected) if streamed else [],
+            }
+        corrected_text = "".join(out)
+    else:
+        corrected_text = correct_with_openai(text)
+
+    if not streamed:
+        yield "result", build_correction_payload(text, corrected_text, cache_key)
+        return
+
+    # Diff while the corrected text is already on its way to the client
+    payload = DIFF_POOL.submit(build_correction_payload, text, corrected_text, cache_key)
+    yield "corrected", {"original_text": text, "corrected_text": corrected_text}
+    yield "result", payload.result()
+
+
+def cached_events(payload: dict):
+    # The "corrected" + "result" events of correction_events, for a payload from the cache
+    yield "corrected", {"original_text": payload["original_text"], "corrected_text": payload["corrected_text"]}
+    yield "result", payload
+
+
+def sse_stream(events):
+    for event, data in events:
+        yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def ndjson_stream(events):
+    # One JSON object per line; the event name travels in the object itself
+    for event, data in events:
+        yield json.dumps({"event": event, **data}) + "\n"
+
+
+# Accept header content type -> framing, for clients that want finished chunks early
+STREAM_FORMATS = {
+    "text/event-stream": sse_stream,
+    "application/x-ndjson": ndjson_stream,
+}
+
+
+# The page stops at 800 words (~5–6k chars); anything far beyond that isn't from the UI
+MAX_TEXT_CHARS = 8000
 
 
 def index(request):
     if request.method == "POST" and request.headers.get("x-requested-with") == "XMLHttpRequest":
-        text = normalize_pasted_text(request.POST.get("text", ""))
+        raw_text = request.POST.get("text", "")
+
+        # Cap token spend + diff CPU; checked before we allocate a normalized copy
+        if len(raw_text) > MAX_TEXT_CHARS:
+            return JsonResponse({"error": "too_long", "max_chars": MAX_TEXT_CHARS}, status=413)
+
+        text = normalize_pasted_text(raw_text)
 
         if not text.strip():
             return JsonResponse({
@@ -256,31 +441,29 @@ def index(request):
                 "error_count": 0,
             })
 
-        # ✅ Chunk correction när texten är lång
-        if len(text) > 2000:
-            corrected_text = correct_with_openai_chunked(text, max_chars=1800)
-        else:
-            corrected_text = correct_with_openai(text)
-
-        # Normal diff (stram)
-        differences = find_differences_charwise(text, corrected_text)
-
-        # ✅ Om det FINNS ändringar men 0 diffs (typiskt vid långa texter / många kommatecken)
-        if not differences and corrected_text.strip() != text.strip():
-            differences = find_differences_charwise(
-                text,
-                corrected_text,
-                max_block_tokens=80,
-                max_block_chars=1200,
-                max_diffs=300,
-            )
+        # Opt-in: clients that accept SSE or NDJSON get finished chunks before the whole text is done
+        accept = request.headers.get("accept", "")
+        content_type = next((ct for ct in STREAM_FORMATS if ct in accept), None)
 
-        return JsonResponse({
-            "original_text": text,
-            "corrected_text": corrected_text,
-            "differences": differences,
-            "error_count": len(differences),
-        })
+        cache_key = correction_cache_key(text)
+        cached = cache.get(cache_key)
+
+        if content_type is None:
+            if cached is not None:
+                return JsonResponse(cached)
+            for event, data in correction_events(text, cache_key, streamed=False):
+                if event == "result":
+                    return JsonResponse(data)
+
+        # A cached text is sent in the same framing, as its final two events
+        if cached is not None:
+            events = cached_events(cached)
+        else:
+            events = correction_events(text, cache_key)
+        response = StreamingHttpResponse(STREAM_FORMATS[content_type](events), content_type=content_type)
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # nginx: flush events immediately
+        return response
 
     return render(request, "checker/index.html")
 
@@ -293,31 +476,23 @@ def same_words_exact(a: str, b: str) -> bool:
 ONLY_COMMA_WS_RE = re.compile(r"^[\s,]*$", re.UNICODE)
 
 def _adjacent_has_comma(orig: str, i1: int, i2: int, cand: str, j1: int, j2: int) -> bool:
-    def ch(s: str, idx: int) -> str:
-        return s[idx] if 0 <= idx < len(s) else ""
     # Check character right before/after the edited segment in either string
-    return (
-        ch(orig, i1 - 1) == "," or ch(orig, i2) == "," or
-        ch(cand, j1 - 1) == "," or ch(cand, j2) == ","
-    )
+    # (slices are "" past either end, so no bounds checks are needed)
+    neighbors = orig[max(0, i1 - 1):i1] + orig[i2:i2 + 1] + cand[max(0, j1 - 1):j1] + cand[j2:j2 + 1]
+    return "," in neighbors
 
-def keep_only_comma_changes(original: str, candidate: str) -> str:
+def _keep_comma_edits(out: list, orig: str, o1: int, o2: int, cand: str, c1: int, c2: int):
     """
-    Keep ONLY:
-    - comma insert/remove
-    - whitespace changes that are directly adjacent to a comma (space after comma etc.)
-    Reject whitespace changes elsewhere (prevents merges like 'privat livet' -> 'privatlivet').
+    Char-level rule for the region orig[o1:o2] -> cand[c1:c2]; appends the kept text to out.
     """
-    orig = unicodedata.normalize("NFC", original or "")
-    cand = unicodedata.normalize("NFC", candidate or "")
-
-    if not orig or not cand:
-        return original
-
-    sm = difflib.SequenceMatcher(a=orig, b=cand, autojunk=False)
-    out = []
+    sm = difflib.SequenceMatcher(a=orig[o1:o2], b=cand[c1:c2], autojunk=False)
 
     for tag, i1, i2, j1, j2 in sm.get_opcodes():
+        i1 += o1
+        i2 += o1
+        j1 += c1
+        j2 += c1
+
         if tag == "equal":
             out.append(orig[i1:i2])
             continue
@@ -337,174 +512,482 @@ def keep_only_comma_changes(original: str, candidate: str) -> str:
             # Revert anything else (word changes, hyphens, etc.)
             out.append(oseg)
 
+
+def keep_only_comma_changes(original: str, candidate: str) -> str:
+    """
+    Keep ONLY:
+    - comma insert/remove
+    - whitespace changes that are directly adjacent to a comma (space after comma etc.)
+    Reject whitespace changes elsewhere (prevents merges like 'privat livet' -> 'privatlivet').
+    """
+    orig = _nfc(original)
+    cand = _nfc(candidate)
+
+    if not orig or not cand:
+        return original
+
+    # Nothing to filter (common: model left the commas alone)
+    if orig == cand:
+        return orig
+
+    # Diff on word/whitespace/punctuation tokens (~5x fewer items than chars);
+    # WS_TOKEN_RE covers every char, so token offsets map straight back to the text
+    orig_toks = WS_TOKEN_RE.findall(orig)
+    cand_toks = WS_TOKEN_RE.findall(cand)
+    orig_off = [0, *itertools.accumulate(map(len, orig_toks))]
+    cand_off = [0, *itertools.accumulate(map(len, cand_toks))]
+
+    def only_comma_ws(toks) -> bool:
+        return all(t == "," or t.isspace() for t in toks)
+
+    sm = difflib.SequenceMatcher(a=orig_toks, b=cand_toks, autojunk=False)
+    out = []
+
+    for tag, i1, i2, j1, j2 in sm.get_opcodes():
+        o1, o2 = orig_off[i1], orig_off[i2]
+        c1, c2 = cand_off[j1], cand_off[j2]
+
+        if tag == "equal":
+            out.append(orig[o1:o2])
+        elif only_comma_ws(orig_toks[i1:i2]) and only_comma_ws(cand_toks[j1:j2]):
+            oseg = orig[o1:o2]
+            cseg = cand[c1:c2]
+            # Always allow if a comma is involved, or the edit touches a comma
+            if ("," in oseg) or ("," in cseg) or _adjacent_has_comma(orig, o1, o2, cand, c1, c2):
+                out.append(cseg)
+            else:
+                # Disallow whitespace-only edits away from commas (prevents word merges/splits)
+                out.append(oseg)
+        else:
+            # Words touched in this region: apply the char-level rule to just this region
+            _keep_comma_edits(out, orig, o1, o2, cand, c1, c2)
+
     return "".join(out)
 
 
 
-def insert_commas_with_openai(text: str) -> str:
+def comma_pass(text: str) -> tuple[str, bool]:
     """
-    Inserts/removes commas ONLY.
+    Inserts/removes commas ONLY: returns (text, whether the pass succeeded).
     Must not change words/letters/case. Only commas + whitespace around commas.
+    Successful results are cached; on an OpenAI error the text comes back unchanged.
     """
+    key = llm_cache_key("comma", text)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached, True
     try:
-        system_prompt = (
-            "Du är en svensk komma-korrekturläsare.\n\n"
-            "REGLER (MÅSTE FÖLJAS):\n"
-            "- Du får en text och du ska ENDAST rätta kommatecken.\n"
-            "- ÄNDRA INTE stavning, versaler/gemener eller ordval.\n"
-            "- LÄGG INTE TILL eller TA INTE BORT ord.\n"
-            "- ÄNDRA INTE ordens ordning.\n"
-            "- Du får ENDAST sätta in/ta bort kommatecken.\n"
-            "- Du får ENDAST ändra mellanslag direkt före eller direkt efter ett kommatecken.\n"
-            "- Du får ALDRIG ta bort/lägga till mellanslag mellan två ord (slå inte ihop eller dela upp ord).\n\n"
-            "Returnera ENDAST texten."
-        )
+        safe = _insert_commas(text)
+    except Exception as e:
+        print("❌ OpenAI comma-only error:", e)
+        return text, False
+    cache.set(key, safe, timeout=CORRECTION_CACHE_TIMEOUT)
+    return safe, True
+
+
+def _insert_commas(text: str) -> str:
+    system_prompt = (
+        "Du är en svensk komma-korrekturläsare.\n\n"
+        "REGLER (MÅSTE FÖLJAS):\n"
+        "- Du får en text och du ska ENDAST rätta kommatecken.\n"
+        "- ÄNDRA INTE stavning, versaler/gemener eller ordval.\n"
+        "- LÄGG INTE TILL eller TA INTE BORT ord.\n"
+        "- ÄNDRA INTE ordens ordning.\n"
+        "- Du får ENDAST sätta in/ta bort kommatecken.\n"
+        "- Du får ENDAST ändra mellanslag direkt före eller direkt efter ett kommatecken.\n"
+        "- Du får ALDRIG ta bort/lägga till mellanslag mellan två ord (slå inte ihop eller dela upp ord).\n\n"
+        "Returnera ENDAST texten."
+    )
 
-        resp = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": text},
-            ],
-            temperature=0,
-        )
-        out = (resp.choices[0].message.content or "").rstrip(" \t")
-        if not out:
-            return text
+    resp = client.chat.completions.create(
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text},
+        ],
+        temperature=0,
+    )
+    out = (resp.choices[0].message.content or "").rstrip(" \t")
+    return filter_comma_answer(text, out)
 
-        # Keep only comma + whitespace changes (prevents word merges/splits)
-        safe = keep_only_comma_changes(text, out)
-        safe = undo_space_merges(text, safe)  # extra safety if model still tries to merge words
-        return safe
 
-    except Exception as e:
-        print("❌ OpenAI comma-only error:", e)
+# Sentence openers that BASE_PROMPT says always take a comma after the clause (rule 1)
+COMMA_CLAUSE_OPENERS = {"om", "när", "eftersom", "medan", "sedan", "ifall", "då"}
+
+
+def _needs_comma_pass(text: str) -> bool:
+    """
+    Cheap guess whether commas may still be missing after the first pass:
+    a sentence without any comma that starts with a subordinate clause
+    ("Om", "När", "För att", ...) or joins clauses with "men", or a long one
+    joined by "och"/"eller". False means the comma-only call is skipped.
+    """
+    start = 0
+    for m in itertools.chain(SENTENCE_BOUNDARY_RE.finditer(text), [None]):
+        end = m.end() if m else len(text)
+        sentence = text[start:end]
+        start = end
+        if "," in sentence:
+            continue
+        words = [w.lower() for w in WORD_RE.findall(sentence)]
+        if len(words) < 4:
+            continue
+        if words[0] in COMMA_CLAUSE_OPENERS or words[:2] == ["för", "att"]:
+            return True
+        if "men" in words[1:]:
+            return True
+        if len(words) >= 8 and ("och" in words[2:-2] or "eller" in words[2:-2]):
+            return True
+    return False
+
+
+def comma_pass_if_needed(original: str, corrected: str) -> tuple[str, bool]:
+    # A text typed without any commas always gets the pass; otherwise only if the guess fires
+    if "," in original and not _needs_comma_pass(corrected):
+        return corrected, True
+    return comma_pass(corrected)
+
+
+def filter_comma_answer(text: str, out: str) -> str:
+    if not out:
         return text
 
+    # Keep only comma + whitespace changes (prevents word merges/splits)
+    safe = keep_only_comma_changes(text, out)
+    safe = undo_space_merges(text, safe)  # extra safety if model still tries to merge words
+    return safe
+
 
 # =================================================
 # OPENAI – SWEDISH (MIRRORS NORWEGIAN STYLE)
 # =================================================
-def correct_with_openai(text: str) -> str:
+BASE_PROMPT = (
+    "Du är en professionell svensk korrekturläsare.\n\n"
+    "MÅL: Rätta ALLA stavfel och ALL interpunktion i texten, särskilt kommatecken, "
+    "utan att ändra innehåll, ordval eller ordföljd.\n\n"
+
+    "ABSOLUTA REGLER (MÅSTE FÖLJAS):\n"
+    "- LÄGG INTE TILL nya ord\n"
+    "- TA INTE BORT ord\n"
+    "- ÄNDRA INTE ordens ordning\n"
+    "- Skriv INTE om meningar och använd INTE synonymer\n"
+    "- Ändra ENDAST bokstäver INUTI befintliga ord för att rätta stavfel\n"
+    "- Du får rätta interpunktion (komma, punkt, kolon, citattecken) och mellanslag\n"
+    "- Bevara radbrytningar och stycken EXAKT som i input\n\n"
+
+    "OBLIGATORISK FELKONTROLL (UTFÖRS TYST INNAN DU SVARAR):\n"
+    "För VARJE mening måste du kontrollera ALLA punkter nedan. "
+    "Hoppa inte över någon punkt, även om meningen ser korrekt ut.\n\n"
+
+    "A) STAVNING:\n"
+    "- Kontrollera varje ord för felstavning\n"
+    "- Kontrollera dubbelteckning, sammansättningar och vanliga förväxlingar\n\n"
+
+    "B) KOMMATECKEN (MYCKET VIKTIGT):\n"
+    "1) Inledande bisats → KOMMA KRÄVS\n"
+    "   (Om, När, Eftersom, Medan, Sedan, För att, Ifall, Då)\n"
+    "2) Inskjutna bisatser / parentetiska inskott → KOMMA RUNT\n"
+    "3) Två huvudsatser med 'och', 'men', 'eller':\n"
+    "   - Har båda subjekt + verb → KOMMA KRÄVS\n"
+    "4) Uppräkningar → KOMMA där det krävs för korrekt grammatik\n"
+    "5) Enkel huvudsats → SÄTT ALDRIG komma mellan subjekt och verb\n\n"
+
+    "C) SLUTKONTROLL:\n"
+    "- Om ett komma saknas enligt reglerna är det ALLTID ett fel\n"
+    "- Om ett stavfel finns måste det rättas\n"
+    "- Returnera ALDRIG identisk text om något fel finns\n\n"
+
+    "Returnera ENDAST den korrigerade texten. Ingen förklaring."
+)
+
+# Retry when the first answer added/removed/substituted whole words
+STRICT_PROMPT = BASE_PROMPT + (
+    "\n\nEXTRA STRIKT:\n"
+    "- Antalet ord i svaret MÅSTE vara identiskt med input\n"
+    "- Varje ord i output ska vara samma ord som input (endast små stavningsändringar är tillåtna)\n"
+    "- Förbättra inte meningar eller flyt; rätta endast skrivfel och interpunktion.\n"
+)
+
+# The usual case in one call: the corrected text plus that same text after the comma
+# check (what comma_pass would return), as JSON. See first_pass_with_commas.
+COMBINED_PROMPT = BASE_PROMPT + (
+    "\n\nSVARSFORMAT (ersätter instruktionen ovan om att returnera ren text):\n"
+    "Svara med JSON med två fält:\n"
+    "- spelling_fixed: den korrigerade texten enligt reglerna ovan\n"
+    "- with_commas: samma text som spelling_fixed, där du granskat kommatecknen en gång till. "
+    "Här får du ENDAST sätta in/ta bort kommatecken och mellanslag direkt intill dem; "
+    "ändra inga ord, bokstäver eller versaler.\n"
+)
+
+CORRECTION_SCHEMA = {
+    "name": "swedish_correction",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "spelling_fixed": {"type": "string"},
+            "with_commas": {"type": "string"},
+        },
+        "required": ["spelling_fixed", "with_commas"],
+        "additionalProperties": False,
+    },
+}
+
+# With SPECULATIVE_STRICT_RETRY on, texts up to this length get the strict retry requested
+# together with the first call. When unused it still costs a whole STRICT_PROMPT call.
+SPECULATIVE_STRICT_MAX_CHARS = 600
+
+
+def call_llm(system_prompt: str, user_text: str) -> str:
+    resp = client.chat.completions.create(
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_text},
+        ],
+        temperature=0,
+    )
+    return (resp.choices[0].message.content or "").rstrip(" \t")
+
+
+def first_pass_with_commas(text: str) -> tuple[str, str | None]:
+    """
+    First attempt as one structured call: (corrected, corrected_with_commas).
+    If the answer isn't the expected JSON, falls back to a plain BASE_PROMPT call
+    and returns None for the comma version (the comma pass then asks separately).
+    """
+    resp = client.chat.completions.create(
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": COMBINED_PROMPT},
+            {"role": "user", "content": text},
+        ],
+        temperature=0,
+        response_format={"type": "json_schema", "json_schema": CORRECTION_SCHEMA},
+    )
+    try:
+        answer = json.loads(resp.choices[0].message.content or "")
+        corrected = answer["spelling_fixed"].rstrip(" \t")
+        with_commas = answer["with_commas"].rstrip(" \t")
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return call_llm(BASE_PROMPT, text), None
+    return corrected, (with_commas or None)
+
+
+def correct_with_openai(text: str, first_pass: str | None = None) -> str:
     """
     Hard constraints:
     - never add/remove/reorder words
     - allow spelling + punctuation + spacing
     - we also undo pure word-merges like "privat livet" -> "privatlivet"
+
+    `first_pass` is the model's answer to BASE_PROMPT when it was already fetched
+    in a batch (see iter_correct_with_openai_batch).
+
+    Complete results are cached per text (llm_cache_key); when a call fails the
+    text falls back to itself and is asked again next time.
     """
+    key = llm_cache_key("fix", text)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
     try:
-        base_prompt = (
-            "Du är en professionell svensk korrekturläsare.\n\n"
-            "MÅL: Rätta ALLA stavfel och ALL interpunktion i texten, särskilt kommatecken, "
-            "utan att ändra innehåll, ordval eller ordföljd.\n\n"
-
-            "ABSOLUTA REGLER (MÅSTE FÖLJAS):\n"
-            "- LÄGG INTE TILL nya ord\n"
-            "- TA INTE BORT ord\n"
-            "- ÄNDRA INTE ordens ordning\n"
-            "- Skriv INTE om meningar och använd INTE synonymer\n"
-            "- Ändra ENDAST bokstäver INUTI befintliga ord för att rätta stavfel\n"
-            "- Du får rätta interpunktion (komma, punkt, kolon, citattecken) och mellanslag\n"
-            "- Bevara radbrytningar och stycken EXAKT som i input\n\n"
-
-            "OBLIGATORISK FELKONTROLL (UTFÖRS TYST INNAN DU SVARAR):\n"
-            "För VARJE mening måste du kontrollera ALLA punkter nedan. "
-            "Hoppa inte över någon punkt, även om meningen ser korrekt ut.\n\n"
-
-            "A) STAVNING:\n"
-            "- Kontrollera varje ord för felstavning\n"
-            "- Kontrollera dubbelteckning, sammansättningar och vanliga förväxlingar\n\n"
-
-            "B) KOMMATECKEN (MYCKET VIKTIGT):\n"
-            "1) Inledande bisats → KOMMA KRÄVS\n"
-            "   (Om, När, Eftersom, Medan, Sedan, För att, Ifall, Då)\n"
-            "2) Inskjutna bisatser / parentetiska inskott → KOMMA RUNT\n"
-            "3) Två huvudsatser med 'och', 'men', 'eller':\n"
-            "   - Har båda subjekt + verb → KOMMA KRÄVS\n"
-            "4) Uppräkningar → KOMMA där det krävs för korrekt grammatik\n"
-            "5) Enkel huvudsats → SÄTT ALDRIG komma mellan subjekt och verb\n\n"
-
-            "C) SLUTKONTROLL:\n"
-            "- Om ett komma saknas enligt reglerna är det ALLTID ett fel\n"
-            "- Om ett stavfel finns måste det rättas\n"
-            "- Returnera ALDRIG identisk text om något fel finns\n\n"
-
-            "Returnera ENDAST den korrigerade texten. Ingen förklaring."
-        )
+        corrected, complete = _correct_with_openai(text, first_pass)
+    except Exception as e:
+        print("❌ OpenAI error:", e)
+        return text
+    if complete:
+        cache.set(key, corrected, timeout=CORRECTION_CACHE_TIMEOUT)
+    return corrected
 
 
-        def call_llm(system_prompt: str, user_text: str) -> str:
-            resp = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_text},
-                ],
-                temperature=0,
-            )
-            return (resp.choices[0].message.content or "").rstrip(" \t")
-
-        # 1) First attempt
-        corrected = call_llm(base_prompt, text)
-        if not corrected:
-            return text
-        
-                # 🚨 HARD FAIL: text had errors but model returned unchanged output
-        if corrected.strip() == text.strip():
-            raise RuntimeError("Model returned unchanged text despite required corrections")
-
-
-        corrected = undo_space_merges(text, corrected)
-
-        # 2) If unchanged, retry once with a nudge
-        if corrected.strip() == text.strip():
-            nudge_prompt = base_prompt + (
-                "\n\nTEXTEN INNEHÅLLER FEL.\n"
-                "Du måste rätta alla tydliga stavfel OCH alla kommateckenfel inom reglerna.\n"
-                "Kör KOMMA-KONTROLLEN (punkt 1–5) mening för mening och returnera inte identisk text om något komma saknas/är fel."
-            )
+def _correct_with_openai(text: str, first_pass: str | None) -> tuple[str, bool]:
+    """
+    Returns (corrected, complete); complete is False if a step fell back to its input.
+    """
+    # Opt-in (see SPECULATIVE_STRICT_RETRY): start the strict retry alongside the first call
+    strict_future = None
+    if SPECULATIVE_STRICT_RETRY and first_pass is None and len(text) <= SPECULATIVE_STRICT_MAX_CHARS:
+        strict_future = RETRY_POOL.submit(call_llm, STRICT_PROMPT, text)
+
+    # 1) First attempt (batched callers may already have it).
+    # Unbatched, the same call also returns the comma-checked version of its answer.
+    with_commas = None
+    if first_pass is not None:
+        corrected = first_pass
+    else:
+        corrected, with_commas = first_pass_with_commas(text)
+    if not corrected:
+        return text, False
+
+    # 🚨 HARD FAIL: text had errors but model returned unchanged output
+    if corrected.strip() == text.strip():
+        # ...unless the comma check of the same answer found something
+        if with_commas is not None:
+            safe = filter_comma_answer(text, with_commas)
+            if safe != text:
+                return safe, True
+        raise RuntimeError("Model returned unchanged text despite required corrections")
+
+
+    corrected = undo_space_merges(text, corrected)
+
+    # 2) If unchanged, retry once with a nudge
+    if corrected.strip() == text.strip():
+        nudge_prompt = BASE_PROMPT + (
+            "\n\nTEXTEN INNEHÅLLER FEL.\n"
+            "Du måste rätta alla tydliga stavfel OCH alla kommateckenfel inom reglerna.\n"
+            "Kör KOMMA-KONTROLLEN (punkt 1–5) mening för mening och returnera inte identisk text om något komma saknas/är fel."
+        )
 
-            corrected2 = call_llm(nudge_prompt, text)
-            if corrected2:
+        corrected2 = call_llm(nudge_prompt, text)
+        if corrected2:
+            # an unchanged answer has no merges to undo; skip the diff
+            if corrected2.strip() != text.strip():
+                corrected2 = undo_space_merges(text, corrected2)
+            corrected = corrected2
+            with_commas = None  # belonged to the replaced answer
+
+    # 3) Validate: if model added/removed/substituted whole words → retry strict once
+    text_words = extract_words(text)  # shared by both validations below
+    if violates_no_word_add_remove(text, corrected, text_words):
+        if strict_future is not None:
+            corrected2 = strict_future.result()
+        else:
+            corrected2 = call_llm(STRICT_PROMPT, text)
+        if corrected2:
+            if corrected2.strip() != text.strip():
                 corrected2 = undo_space_merges(text, corrected2)
+
+            # ✅ IMPORTANT: don't return yet — let comma-only pass run later
+            if not violates_no_word_add_remove(text, corrected2, text_words):
                 corrected = corrected2
+                with_commas = None
+            else:
+                # 4) Salvage instead of returning original:
+                salvaged = project_safe_word_corrections(text, corrected2)
+                if not salvaged:
+                    salvaged = project_safe_word_corrections(text, corrected)
 
-        # 3) Validate: if model added/removed/substituted whole words → retry strict once
-# 3) Validate: if model added/removed/substituted whole words → retry strict once
-        if violates_no_word_add_remove(text, corrected):
-            strict_prompt = base_prompt + (
-                "\n\nEXTRA STRIKT:\n"
-                "- Antalet ord i svaret MÅSTE vara identiskt med input\n"
-                "- Varje ord i output ska vara samma ord som input (endast små stavningsändringar är tillåtna)\n"
-                "- Förbättra inte meningar eller flyt; rätta endast skrivfel och interpunktion.\n"
-            )
-            corrected2 = call_llm(strict_prompt, text)
-            if corrected2:
-                corrected2 = undo_space_merges(text, corrected2)
+                if salvaged:
+                    return comma_pass_if_needed(text, salvaged)
 
-                # ✅ IMPORTANT: don't return yet — let comma-only pass run later
-                if not violates_no_word_add_remove(text, corrected2):
-                    corrected = corrected2
-                else:
-                    # 4) Salvage instead of returning original:
-                    salvaged = project_safe_word_corrections(text, corrected2)
-                    if not salvaged:
-                        salvaged = project_safe_word_corrections(text, corrected)
+        # If strict failed, keep going with whatever we had (and run comma-only pass)
 
-                    if salvaged:
-                        salvaged = insert_commas_with_openai(salvaged)
-                        return salvaged
 
-            # If strict failed, keep going with whatever we had (and run comma-only pass)
+    # ✅ second pass: comma-only (won't change words).
+    # Already answered by the first call as long as its text was kept; same filter as the comma pass.
+    if with_commas is not None:
+        return filter_comma_answer(corrected, with_commas), True
+    return comma_pass_if_needed(text, corrected)
 
 
-        # ✅ second pass: comma-only (won't change words)
-        corrected = insert_commas_with_openai(corrected)
-        return corrected
+# =================================================
+# OPENAI – BATCHED FIRST PASS (LONG TEXTS)
+# =================================================
+# Several chunks share one first-pass call, so the long system prompt is paid once
+CHUNK_BATCH_SIZE = 4
+
+BATCH_PROMPT = BASE_PROMPT + (
+    "\n\nINPUT-FORMAT:\n"
+    "Du får flera separata texter. Varje text inleds av en egen rad '### N' (N = 0, 1, 2 ...).\n"
+    "Rätta varje text för sig enligt reglerna ovan.\n"
+    "Returnera ALLA texter i exakt samma format: raden '### N' och sedan den korrigerade texten.\n"
+    "Behåll numreringen och ordningen. Slå inte ihop och hoppa inte över någon text."
+)
+
+# Accepts '### 1' as well as '###1' — the model doesn't always keep the space
+BATCH_MARKER_RE = re.compile(r"^###[ \t]*(\d+)[ \t]*\n?", re.M)
 
+
+def split_batch_answer(answer: str, n: int):
+    """
+    Splits a '### N'-framed answer back into n segments.
+    Returns None if the framing doesn't match (caller falls back to one call per text).
+    """
+    pieces = BATCH_MARKER_RE.split(answer or "")
+    # pieces = [before_first_marker, "0", seg0, "1", seg1, ...]
+    if pieces[0].strip() or len(pieces) != 1 + 2 * n:
+        return None
+    if [int(x) for x in pieces[1::2]] != list(range(n)):
+        return None
+    return pieces[2::2]
+
+
+def first_pass_batch(texts: list[str]) -> list[str | None]:
+    """
+    One BASE_PROMPT call for a whole group of texts.
+    Returns the first-pass answer per text, or None where the text must be asked alone.
+    """
+    if len(texts) < 2:
+        return [None] * len(texts)
+
+    numbered = "\n".join(f"### {i}\n{t.strip()}" for i, t in enumerate(texts))
+    try:
+        answer = call_llm(BATCH_PROMPT, numbered)
     except Exception as e:
-        print("❌ OpenAI error:", e)
-        return text
+        print("❌ OpenAI batch error:", e)
+        return [None] * len(texts)
+
+    segments = split_batch_answer(answer, len(texts))
+    if segments is None:
+        return [None] * len(texts)
+
+    out = []
+    for t, seg in zip(texts, segments):
+        seg = seg.strip()
+        if not seg:
+            out.append(None)
+            continue
+        # Framing strips edge whitespace; put each chunk's own back (paragraph breaks)
+        lead = t[:len(t) - len(t.lstrip())]
+        trail = t[len(t.rstrip()):]
+        out.append(lead + seg + trail)
+    return out
+
+
+def iter_bounded(fn, arg_tuples, limit: int = MAX_CALLS_PER_REQUEST):
+    """
+    Runs fn(*args) on CHUNK_POOL for every args, with at most `limit` of them in flight
+    for this request, and yields (index, result) in completion order.
+    The window keeps one long text from taking the whole pool or bursting past TPM limits.
+    """
+    todo = enumerate(arg_tuples)
+    pending = {CHUNK_POOL.submit(fn, *args): i for i, args in itertools.islice(todo, limit)}
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            i = pending.pop(fut)
+            for j, args in itertools.islice(todo, 1):
+                pending[CHUNK_POOL.submit(fn, *args)] = j
+            yield i, fut.result()
+
+
+def iter_correct_with_openai_batch(texts: list[str]):
+    """
+    Yields (index, corrected) per text as soon as that text is done (completion order).
+    First pass: one call per CHUNK_BATCH_SIZE texts. Retries + comma pass: per text.
+    Both stages run concurrently on CHUNK_POOL (see iter_bounded).
+    Chunks already in the cache are yielded first and left out of the batch.
+    """
+    keys = [llm_cache_key("fix", t) for t in texts]
+    hits = cache.get_many(keys)
+    todo = []
+    for i, key in enumerate(keys):
+        if key in hits:
+            yield i, hits[key]
+        else:
+            todo.append(i)
+    misses = [texts[i] for i in todo]
+
+    groups = [misses[k:k + CHUNK_BATCH_SIZE] for k in range(0, len(misses), CHUNK_BATCH_SIZE)]
+    answers = [None] * len(groups)
+    for g, group_answers in iter_bounded(first_pass_batch, [(group,) for group in groups]):
+        answers[g] = group_answers
+    first = [a for group_answers in answers for a in group_answers]
+
+    for k, corrected in iter_bounded(correct_with_openai, list(zip(misses, first))):
+        yield todo[k], corrected
 
 
 WS_TOKEN_RE = re.compile(r"\s+|\w+|[^\w\s]", re.UNICODE)
@@ -523,20 +1006,27 @@ def undo_space_merges(original: str, corrected: str, max_merge_words: int = 3) -
     if not original or not corrected:
         return corrected
 
-    orig_full = WS_TOKEN_RE.findall(unicodedata.normalize("NFC", original))
-    corr_full = WS_TOKEN_RE.findall(unicodedata.normalize("NFC", corrected))
+    # No change → no merge to undo; skip tokenizing + diffing
+    if original == corrected:
+        return corrected
+
+    orig_full = WS_TOKEN_RE.findall(_nfc(original))
+    corr_full = WS_TOKEN_RE.findall(_nfc(corrected))
 
     def is_ws(t: str) -> bool:
         return t.isspace()
 
     # Letters-only (no digits/underscore). Works for Swedish letters too.
     def is_word(t: str) -> bool:
-        return bool(re.fullmatch(r"[^\W\d_]+", t, re.UNICODE))
+        return bool(WORD_RE.fullmatch(t))
+
+    # 1 per whitespace token; lets the "only whitespace between" check below count in C
+    orig_ws_mask = bytes(map(is_ws, orig_full))
 
     # Build "significant token" lists (no whitespace) + map sig-index -> full-index
     orig_sig, orig_map = [], []
     for idx, tok in enumerate(orig_full):
-        if not is_ws(tok):
+        if not orig_ws_mask[idx]:
             orig_sig.append(tok)
             orig_map.append(idx)
 
@@ -547,45 +1037,57 @@ def undo_space_merges(original: str, corrected: str, max_merge_words: int = 3) -
             corr_map.append(idx)
 
     # Lowercase for matching
-    sm = difflib.SequenceMatcher(
-        a=[t.lower() for t in orig_sig],
-        b=[t.lower() for t in corr_sig],
-        autojunk=False,
-    )
+    orig_low = [t.lower() for t in orig_sig]
+    corr_low = [t.lower() for t in corr_sig]
+    orig_is_word = [is_word(t) for t in orig_sig]
+
+    # Every run of 2..max_merge_words original words, keyed by what it reads when merged
+    merge_map = {}  # joined lowercase words -> [(start, n), ...] in original order
+    for n in range(2, max_merge_words + 1):
+        for i in range(len(orig_low) - n + 1):
+            if all(orig_is_word[i:i + n]):
+                merge_map.setdefault("".join(orig_low[i:i + n]), []).append((i, n))
+    merge_map = {k: sorted(v) for k, v in merge_map.items()}
 
     replacements = {}  # corr_full_index -> replacement_string
+    next_free = 0  # merges are matched left to right; a word is never used twice
 
-    for tag, i1, i2, j1, j2 in sm.get_opcodes():
-        if tag != "replace":
-            continue
-
-        # We only care about N words -> 1 word
-        if (j2 - j1) != 1:
-            continue
-        n = (i2 - i1)
-        if not (2 <= n <= max_merge_words):
-            continue
+    # A merge creates a word: one that is no more frequent than in the original was
+    # already there (repetitive text can otherwise line up with a window by accident)
+    orig_counts = Counter(orig_low)
+    corr_counts = Counter(corr_low)
 
-        corr_tok = corr_sig[j1]
-        if not is_word(corr_tok):
+    for j, corr_tok in enumerate(corr_low):
+        candidates = merge_map.get(corr_tok)
+        if not candidates or not is_word(corr_sig[j]):
             continue
-        if not all(is_word(t) for t in orig_sig[i1:i2]):
+        if corr_counts[corr_tok] <= orig_counts[corr_tok]:
             continue
 
-        # Pure merge check: join original words equals corrected word (case-insensitive)
-        if "".join(orig_sig[i1:i2]).lower() != corr_tok.lower():
-            continue
-
-        # Make sure the original region between these word tokens contains ONLY whitespace
-        start_full = orig_map[i1]
-        end_full = orig_map[i2 - 1]
-        between = orig_full[start_full:end_full + 1]
-        if sum(1 for t in between if not is_ws(t)) != n:
-            continue
-
-        replacement_str = "".join(between)  # preserves original whitespace between words
-        corr_full_index = corr_map[j1]
-        replacements[corr_full_index] = replacement_str
+        for i1, n in candidates:
+            i2 = i1 + n
+            if i1 < next_free:
+                continue
+            # Pure N words -> 1 word: the tokens on both sides must line up unchanged
+            # (what SequenceMatcher's equal blocks around the replace used to guarantee)
+            if (i1 == 0) != (j == 0) or (i1 and orig_low[i1 - 1] != corr_low[j - 1]):
+                continue
+            if (i2 == len(orig_low)) != (j + 1 == len(corr_low)):
+                continue
+            if i2 < len(orig_low) and orig_low[i2] != corr_low[j + 1]:
+                continue
+
+            # Make sure the original region between these word tokens contains ONLY whitespace
+            start_full = orig_map[i1]
+            end_full = orig_map[i2 - 1]
+            span = end_full + 1 - start_full
+            if span - orig_ws_mask[start_full:end_full + 1].count(1) != n:
+                continue
+
+            replacement_str = "".join(orig_full[start_full:end_full + 1])  # preserves original whitespace between words
+            replacements[corr_map[j]] = replacement_str
+            next_free = i2
+            break
 
     if not replacements:
         return corrected
@@ -600,80 +1102,337 @@ def undo_space_merges(original: str, corrected: str, max_merge_words: int = 3) -
 # =================================================
 # DIFF ENGINE (IDENTICAL TO NORWEGIAN/DANISH)
 # =================================================
-def find_differences_charwise(original: str, corrected: str, max_block_tokens: int = 14, max_block_chars: int = 180, max_diffs: int = 250):
+# Plain `re` on purpose: these patterns have no backtracking (no lazy `.*?`), and a
+# full MAX_TEXT_CHARS text tokenizes in well under a millisecond
+TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+PUNCT_ONLY_RE = re.compile(r"[^\w\s]+", re.UNICODE)
+WHITESPACE_RE = re.compile(r"\s+")
+
+def tokens_with_spans(s: str):
+    """
+    One regex pass gives the tokens and their char offsets.
+    Starts/ends are flat int arrays (no (start, end) tuple per token); the diff
+    only ever reads starts[i] and ends[i].
+    """
+    matches = list(TOKEN_RE.finditer(s))
+    starts = array("i", [m.start() for m in matches])
+    ends = array("i", [m.end() for m in matches])
+    return [m.group(0) for m in matches], starts, ends
+
+
+# Above this many tokens the word-level diff lets difflib junk popular tokens
+AUTOJUNK_MIN_TOKENS = 500
+
+
+def myers_matching_blocks(a: list, b: list, max_d: int):
+    """
+    Matching blocks (i, j, size) of a shortest edit script from a to b
+    (Myers' O(ND) greedy algorithm, D = inserts + deletes).
+    Returns None as soon as more than max_d edits would be needed.
+    """
+    n, m = len(a), len(b)
+    # Common prefix/suffix never enter the search
+    pre = 0
+    while pre < n and pre < m and a[pre] == b[pre]:
+        pre += 1
+    suf = 0
+    while suf < n - pre and suf < m - pre and a[n - 1 - suf] == b[m - 1 - suf]:
+        suf += 1
+    a_mid, b_mid = a[pre:n - suf], b[pre:m - suf]
+    N, M = len(a_mid), len(b_mid)
+
+    # v[k] = furthest x reached on diagonal k = x - y; trace[d] = v before step d
+    v = {1: 0}
+    trace = []
+    done = False
+    for d in range(min(max_d, N + M) + 1):
+        trace.append(v.copy())
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]  # down: insert b[y]
+            else:
+                x = v[k - 1] + 1  # right: delete a[x]
+            y = x - k
+            while x < N and y < M and a_mid[x] == b_mid[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= N and y >= M:
+                done = True
+                break
+        if done:
+            break
+    if not done:
+        return None
+
+    # Walk back from (N, M) and collect the diagonal runs ("snakes")
+    blocks = []
+    x, y = N, M
+    for d in range(len(trace) - 1, -1, -1):
+        k = x - y
+        if d == 0:
+            prev_x = prev_y = snake_x = 0
+        else:
+            v = trace[d]
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                prev_x = snake_x = v[k + 1]
+                prev_y = prev_x - (k + 1)
+            else:
+                prev_x = v[k - 1]
+                prev_y = prev_x - (k - 1)
+                snake_x = prev_x + 1
+        if x > snake_x:
+            blocks.append((pre + snake_x, pre + snake_x - k, x - snake_x))
+        x, y = prev_x, prev_y
+    blocks.reverse()
+    if pre:
+        blocks.insert(0, (0, 0, pre))
+    if suf:
+        blocks.append((n - suf, m - suf, suf))
+    return blocks
+
+
+def opcodes_from_blocks(a: list, b: list, blocks):
+    """
+    SequenceMatcher-style opcodes from matching blocks.
+
+    Where an edit script has "delete X, equal E, insert Y" (or the mirror) and X
+    can slide across E (same tokens), the two edits are joined into one
+    "replace" — the way SequenceMatcher reports a misspelled repeated word.
+    A delete/insert also slides onto a neighbouring "replace" (a merge like
+    "är om" -> "ärom" beside a repeated "om" stays one "replace") or onto an
+    edit of its own kind (two deletes become one, which may then join the above).
+    """
+    n, m = len(a), len(b)
+    opcodes = []
+    i = j = 0
+    for ai, bj, size in blocks + [(n, m, 0)]:
+        if i < ai and j < bj:
+            opcodes.append(["replace", i, ai, j, bj])
+        elif i < ai:
+            opcodes.append(["delete", i, ai, j, bj])
+        elif j < bj:
+            opcodes.append(["insert", i, ai, j, bj])
+        i, j = ai + size, bj + size
+        if size:
+            if opcodes and opcodes[-1][0] == "equal":
+                opcodes[-1][2], opcodes[-1][4] = i, j
+            else:
+                opcodes.append(["equal", ai, i, bj, j])
+
+    k = 0
+    while k + 2 < len(opcodes):
+        first, eq, second = opcodes[k:k + 3]
+        # Any pair of edits except replace + replace; a "replace" itself never slides
+        if eq[0] == "equal" and (first[0], second[0]) != ("replace", "replace"):
+            tag = first[0] if first[0] == second[0] else "replace"
+            size = eq[2] - eq[1]
+            i1, j1, i2, j2 = first[1], first[3], second[2], second[4]
+            seq, f1, f2 = (a, first[1], first[2]) if first[0] == "delete" else (b, first[3], first[4])
+            s_seq, s1, s2 = (a, second[1], second[2]) if second[0] == "delete" else (b, second[3], second[4])
+            if first[0] != "replace" and seq[f1:f1 + size] == seq[f2:f2 + size]:
+                # first edit slides forward past the equal run
+                merged = [["equal", i1, i1 + size, j1, j1 + size], [tag, i1 + size, i2, j1 + size, j2]]
+            elif second[0] != "replace" and s_seq[s1 - size:s1] == s_seq[s2 - size:s2]:
+                # second edit slides back in front of it
+                merged = [[tag, i1, i2 - size, j1, j2 - size], ["equal", i2 - size, i2, j2 - size, j2]]
+            else:
+                k += 1
+                continue
+            opcodes[k:k + 3] = merged
+            # keep equal runs maximal
+            for pos in (k + 2, k + 1, k):
+                if 0 < pos < len(opcodes) and opcodes[pos][0] == opcodes[pos - 1][0] == "equal":
+                    opcodes[pos - 1][2], opcodes[pos - 1][4] = opcodes[pos][2], opcodes[pos][4]
+                    del opcodes[pos]
+            k = max(k - 2, 0)  # the join may complete the triple before it
+            continue
+        k += 1
+
+    return [tuple(op) for op in opcodes]
+
+
+def realign_edit_clusters(a: list, b: list, opcodes, max_gap: int = 2):
+    """
+    Re-aligns edits that are at most max_gap equal tokens apart with SequenceMatcher.
+
+    Myers may match a repeated token to the other copy than SequenceMatcher would,
+    which no slide can undo: "sol där sol" -> "soldär sol" then becomes
+    insert "soldär" + delete "där" instead of one "replace". Inside such a cluster
+    SequenceMatcher decides; the clusters are small, so this stays cheap.
+    """
+    out = []
+
+    def emit(op):
+        if op[0] == "equal" and out and out[-1][0] == "equal":
+            out[-1] = ("equal", out[-1][1], op[2], out[-1][3], op[4])
+        else:
+            out.append(op)
+
+    k = 0
+    while k < len(opcodes):
+        end = k
+        if opcodes[k][0] != "equal":
+            while end + 2 < len(opcodes) and opcodes[end + 2][0] != "equal" and \
+                    opcodes[end + 1][2] - opcodes[end + 1][1] <= max_gap:
+                end += 2
+        if end == k:
+            emit(opcodes[k])
+        else:
+            i1, j1, i2, j2 = opcodes[k][1], opcodes[k][3], opcodes[end][2], opcodes[end][4]
+            sm = difflib.SequenceMatcher(a=a[i1:i2], b=b[j1:j2], autojunk=False)
+            for tag, x1, x2, y1, y2 in sm.get_opcodes():
+                emit((tag, i1 + x1, i1 + x2, j1 + y1, j1 + y2))
+        k = end + 1
+    return out
+
+
+def token_opcodes(a: list, b: list, autojunk: bool | None = None):
+    """
+    Opcodes in the format of SequenceMatcher(a=a, b=b, autojunk=False).get_opcodes()
+    (autojunk=True past AUTOJUNK_MIN_TOKENS unless `autojunk` says otherwise),
+    with a linear fast path for the common "spelling fixes only" case.
+    When only a few edits are needed they come from Myers' diff instead: also a
+    minimal edit script, but where a token repeats, an edit may sit at a different
+    copy of it than SequenceMatcher would pick (see opcodes_from_blocks).
+
+    If both lists have the same length and no differing token occurs anywhere in
+    the other list, every match SequenceMatcher can find is position-aligned,
+    so walking the two lists in parallel yields exactly its opcodes.
+    """
+    n = len(a)
+    if n == len(b):
+        diff_idx = [i for i, (x, y) in enumerate(zip(a, b)) if x != y]
+        if {a[i] for i in diff_idx}.isdisjoint(b) and {b[i] for i in diff_idx}.isdisjoint(a):
+            opcodes = []
+            pos = k = 0
+            while k < len(diff_idx):
+                start = end = diff_idx[k]
+                while k < len(diff_idx) and diff_idx[k] == end:
+                    end += 1
+                    k += 1
+                if start > pos:
+                    opcodes.append(("equal", pos, start, pos, start))
+                opcodes.append(("replace", start, end, start, end))
+                pos = end
+            if pos < n:
+                opcodes.append(("equal", pos, n, pos, n))
+            return opcodes
+
+    # Few edits relative to the length (the usual LLM answer): Myers is O((n+m)·D),
+    # where SequenceMatcher rescans every popular token. The multiset difference
+    # is a lower bound on D; give up and fall back if the real D is much larger.
+    d_min = sum(((Counter(a) - Counter(b)) + (Counter(b) - Counter(a))).values())
+    if d_min * (n + len(b)) < n * len(b) // 4:
+        blocks = myers_matching_blocks(a, b, max_d=2 * d_min + 16)
+        if blocks is not None:
+            return realign_edit_clusters(a, b, opcodes_from_blocks(a, b, blocks))
+
+    # Important: disable autojunk (it can behave oddly on short/repetitive text).
+    # Long texts turn it back on: dropping very common tokens ("och", ",", ".")
+    # keeps the matcher near-linear, and the diff list is capped anyway.
+    if autojunk is None:
+        autojunk = n > AUTOJUNK_MIN_TOKENS or len(b) > AUTOJUNK_MIN_TOKENS
+    return difflib.SequenceMatcher(a=a, b=b, autojunk=autojunk).get_opcodes()
+
+
+def prepare_diff(original: str, corrected: str, autojunk: bool | None = None):
+    """
+    Normalize + tokenize both texts and compute the token opcodes once.
+    The result can be handed to several find_differences_charwise calls
+    (strict limits, then relaxed) without redoing this work.
+    `autojunk` is passed on to token_opcodes.
+    """
+    orig_text = _nfc((original or "").replace("\r\n", "\n").replace("\r", "\n"))
+    corr_text = _nfc((corrected or "").replace("\r\n", "\n").replace("\r", "\n"))
+
+    # Unchanged text (common: input already correct) → nothing to tokenize or diff
+    if orig_text == corr_text:
+        return orig_text, corr_text, [], (array("i"), array("i")), [], (array("i"), array("i")), []
+
+    orig_tokens, *orig_spans = tokens_with_spans(orig_text)
+    corr_tokens, *corr_spans = tokens_with_spans(corr_text)
+
+    opcodes = token_opcodes(orig_tokens, corr_tokens, autojunk=autojunk)
+
+    return orig_text, corr_text, orig_tokens, tuple(orig_spans), corr_tokens, tuple(corr_spans), opcodes
+
+
+def _span_range(spans, i1: int, i2: int):
+    """Char span from token i1's start to token i2-1's end (i1 < i2), including whitespace between."""
+    return spans[0][i1], spans[1][i2 - 1]
+
+
+def _span_point(spans, i: int, text_len: int):
+    """Empty char span at an insertion point: before token i (end of text past the last token)."""
+    starts = spans[0]
+    if not starts:
+        return 0, 0
+    if i >= len(starts):
+        return text_len, text_len
+    return starts[i], starts[i]
+
+
+def find_differences_charwise(original: str, corrected: str, max_block_tokens: int = 14, max_block_chars: int = 180, max_diffs: int = 250, prepared=None):
     """
     Robust token diff that:
     - handles merges/splits (e.g., 'e - post' -> 'e-post')
     - returns original-string char spans (start/end) so frontend can highlight precisely
     - groups adjacent diffs into larger 'areas' to avoid highlighting every single word
+
+    `prepared` is an optional prepare_diff(original, corrected) result to reuse.
     """
-    orig_text = unicodedata.normalize("NFC", (original or "").replace("\r\n", "\n").replace("\r", "\n"))
-    corr_text = unicodedata.normalize("NFC", (corrected or "").replace("\r\n", "\n").replace("\r", "\n"))
+    if prepared is None:
+        prepared = prepare_diff(original, corrected)
+    orig_text, corr_text, orig_tokens, orig_spans, corr_tokens, corr_spans, opcodes = prepared
 
-    if not orig_text and not corr_text:
+    if not opcodes:
         return []
 
-    token_re = re.compile(r"\w+|[^\w\s]", re.UNICODE)
-
-    def tokens_with_spans(s: str):
-        toks, spans = [], []
-        for m in token_re.finditer(s):
-            toks.append(m.group(0))
-            spans.append((m.start(), m.end()))
-        return toks, spans
-
-    orig_tokens, orig_spans = tokens_with_spans(orig_text)
-    corr_tokens, corr_spans = tokens_with_spans(corr_text)
-
-    def span_for_token_range(spans, i1, i2, text_len):
-        """Char span from first token start to last token end, including any whitespace between."""
-        if not spans:
-            return 0, 0
-        if i1 >= len(spans):
-            return text_len, text_len
-        if i1 == i2:
-            # insertion point: before token i1
-            return spans[i1][0], spans[i1][0]
-        return spans[i1][0], spans[i2 - 1][1]
-
     def norm_no_space(s: str) -> str:
         # remove whitespace only; keep punctuation so 'e - post' ~ 'e-post'
-        return re.sub(r"\s+", "", s.lower())
-
-    def similarity(a: str, b: str) -> float:
-        return difflib.SequenceMatcher(a=a, b=b).ratio()
+        # (expects lower-cased input)
+        return WHITESPACE_RE.sub("", s)
 
     def is_pure_punct(s: str) -> bool:
         # punctuation-only string (commas, periods, hyphens, etc.)
-        return bool(re.fullmatch(r"[^\w\s]+", s, re.UNICODE))
-
-    # Important: disable autojunk (it can behave oddly on short/repetitive text)
-    sm = difflib.SequenceMatcher(a=orig_tokens, b=corr_tokens, autojunk=False)
+        return bool(PUNCT_ONLY_RE.fullmatch(s))
 
     raw_diffs = []
+    orig_len = len(orig_text)
+    corr_len = len(corr_text)
 
     # Build raw diffs from opcodes
-    for tag, i1, i2, j1, j2 in sm.get_opcodes():
+    for tag, i1, i2, j1, j2 in opcodes:
         if tag == "equal":
             continue
 
-        o_start, o_end = span_for_token_range(orig_spans, i1, i2, len(orig_text))
-        c_start, c_end = span_for_token_range(corr_spans, j1, j2, len(corr_text))
+        # Keep things local (prevents huge “rewrite” highlights).
+        # Both limits are checked on indices/offsets, before any text is sliced.
+        if (i2 - i1) + (j2 - j1) > max_block_tokens:
+            continue
 
-        o_chunk = orig_text[o_start:o_end]
-        c_chunk = corr_text[c_start:c_end]
+        # An opcode's range is empty on at most one side: the orig side for inserts, corr for deletes
+        if tag == "insert":
+            o_start, o_end = _span_point(orig_spans, i1, orig_len)
+        else:
+            o_start, o_end = _span_range(orig_spans, i1, i2)
+        if tag == "delete":
+            c_start, c_end = _span_point(corr_spans, j1, corr_len)
+        else:
+            c_start, c_end = _span_range(corr_spans, j1, j2)
 
-        # Keep things local (prevents huge “rewrite” highlights)
-        o_tok_count = i2 - i1
-        c_tok_count = j2 - j1
-        if (o_tok_count + c_tok_count) > max_block_tokens:
-            continue
-        if (len(o_chunk) + len(c_chunk)) > max_block_chars:
+        if (o_end - o_start) + (c_end - c_start) > max_block_chars:
             continue
 
+        o_chunk = orig_text[o_start:o_end]
+        c_chunk = corr_text[c_start:c_end]
+
         if tag == "replace":
             # Accept if it's basically a local correction OR a whitespace-merge/split
-            if norm_no_space(o_chunk) == norm_no_space(c_chunk) or similarity(o_chunk.lower(), c_chunk.lower()) >= 0.55:
+            o_low = o_chunk.lower()
+            c_low = c_chunk.lower()
+            if norm_no_space(o_low) == norm_no_space(c_low) or similarity(o_low, c_low) >= 0.55:
                 raw_diffs.append({
                     "type": "replace",
                     "start": o_start,
@@ -698,18 +1457,23 @@ def find_differences_charwise(original: str, corrected: str, max_block_tokens: i
                 left_j = max(j1 - 1, 0)
                 right_j = min(j2 + 1, len(corr_tokens))
 
-                o_start2, o_end2 = span_for_token_range(orig_spans, left_i, right_i, len(orig_text))
-                c_start2, c_end2 = span_for_token_range(corr_spans, left_j, right_j, len(corr_text))
-
-                o_chunk2 = orig_text[o_start2:o_end2]
-                c_chunk2 = corr_text[c_start2:c_end2]
-
                 # Keep things local (same safety limits)
                 if ((right_i - left_i) + (right_j - left_j)) > max_block_tokens:
                     continue
-                if (len(o_chunk2) + len(c_chunk2)) > max_block_chars:
+
+                # The orig context is empty only when the original has no tokens at all
+                if right_i > left_i:
+                    o_start2, o_end2 = _span_range(orig_spans, left_i, right_i)
+                else:
+                    o_start2, o_end2 = _span_point(orig_spans, left_i, orig_len)
+                c_start2, c_end2 = _span_range(corr_spans, left_j, right_j)
+
+                if (o_end2 - o_start2) + (c_end2 - c_start2) > max_block_chars:
                     continue
 
+                o_chunk2 = orig_text[o_start2:o_end2]
+                c_chunk2 = corr_text[c_start2:c_end2]
+
                 if o_chunk2 != c_chunk2:
                     raw_diffs.append({
                         "type": "replace",
@@ -738,40 +1502,34 @@ def find_differences_charwise(original: str, corrected: str, max_block_tokens: i
         return []
 
     # Sort and GROUP into “areas” (merge diffs separated only by whitespace)
-    raw_diffs.sort(key=lambda d: (d["start"], d["end"]))
+    raw_diffs.sort(key=itemgetter("start", "end"))
 
     grouped = [raw_diffs[0]]
     for d in raw_diffs[1:]:
         prev = grouped[-1]
 
-        gap = orig_text[prev["end"]:d["start"]]
-        gap_is_only_ws = (gap.strip() == "")
-        gap_has_parabreak = ("\n\n" in gap)
-
-        # Merge only if there is no paragraph break between
-        if gap_is_only_ws and (not gap_has_parabreak) and (d["start"] <= prev["end"] + 2):
-
-            prev["end"] = max(prev["end"], d["end"])
-            prev["start"] = min(prev["start"], d["start"])
-
-            # Rebuild the displayed chunks
-            prev["original"] = orig_text[prev["start"]:prev["end"]]
-
-            # Best-effort: if we have corrected spans, merge them too
-            if "c_start" in prev and "c_start" in d:
+        # Merge only if there is no paragraph break between (distance first: no slice needed)
+        if d["start"] <= prev["end"] + 2:
+            gap = orig_text[prev["end"]:d["start"]]
+            if not gap.strip() and "\n\n" not in gap:
+                prev["end"] = max(prev["end"], d["end"])
+                prev["start"] = min(prev["start"], d["start"])
+                # Every raw diff carries its corrected span; merge that too
                 prev["c_start"] = min(prev["c_start"], d["c_start"])
                 prev["c_end"] = max(prev["c_end"], d["c_end"])
-                prev["suggestion"] = corr_text[prev["c_start"]:prev["c_end"]]
-
-            prev["type"] = "replace"
-        else:
-            grouped.append(d)
+                prev["type"] = "replace"
+                prev["merged"] = True  # displayed chunks are rebuilt once, below
+                continue
+        grouped.append(d)
 
     # Optional: dedupe identical spans
     out = []
     seen = set()
     for d in grouped:
-        key = (d["start"], d["end"], d.get("suggestion", ""))
+        if "merged" in d:
+            d["original"] = orig_text[d["start"]:d["end"]]
+            d["suggestion"] = corr_text[d["c_start"]:d["c_end"]]
+        key = (d["start"], d["end"], d["suggestion"])
         if key in seen:
             continue
         seen.add(key)
@@ -782,16 +1540,151 @@ def find_differences_charwise(original: str, corrected: str, max_block_tokens: i
             "original": d["original"],
             "suggestion": d["suggestion"],
         })
+        if len(out) >= max_diffs:
+            break
 
     return out[:max_diffs]
 
 
+# =================================================
+# BULK CORRECTION (OPENAI BATCH API)
+# =================================================
+# Non-interactive: half the token price, results within 24h.
+MAX_BATCH_TEXTS = 100
+
+
+def build_batch_jsonl(texts: list[str]) -> bytes:
+    lines = []
+    for i, t in enumerate(texts):
+        lines.append(json.dumps({
+            "custom_id": str(i),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": "gpt-4o",
+                "messages": [
+                    {"role": "system", "content": BASE_PROMPT},
+                    {"role": "user", "content": t},
+                ],
+                "temperature": 0,
+            },
+        }))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def finish_batch_correction(text: str, answer: str) -> str:
+    """
+    Same safety net as correct_with_openai, minus its extra calls
+    (retries/comma pass would be synchronous and defeat the batch discount).
+    """
+    corrected = (answer or "").rstrip(" \t")
+    if not corrected:
+        return text
+    corrected = undo_space_merges(text, corrected)
+    if violates_no_word_add_remove(text, corrected):
+        corrected = project_safe_word_corrections(text, corrected)
+    return corrected
+
+
+def refresh_correction_batch(batch: CorrectionBatch) -> CorrectionBatch:
+    """Polls OpenAI once; stores the corrected texts when the batch has completed."""
+    if batch.is_final:
+        return batch
+
+    remote = client.batches.retrieve(batch.openai_batch_id)
+    batch.status = remote.status
+
+    if remote.status == "completed":
+        # No output file at all when every request failed
+        answers = {}
+        lines = client.files.content(remote.output_file_id).text.splitlines() if remote.output_file_id else []
+        for line in lines:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            body = (row.get("response") or {}).get("body") or {}
+            choices = body.get("choices") or []
+            if choices:
+                answers[row["custom_id"]] = choices[0]["message"].get("content") or ""
+
+        # Texts whose request failed come back unchanged
+        batch.results = [
+            finish_batch_correction(t, answers.get(str(i), ""))
+            for i, t in enumerate(batch.texts)
+        ]
+
+    batch.save(update_fields=["status", "results", "updated_at"])
+    return batch
+
+
+def batch_payload(batch: CorrectionBatch) -> dict:
+    return {
+        "id": batch.pk,
+        "status": batch.status,
+        "results": batch.results,
+    }
+
+
+def submit_batch(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "method_not_allowed"}, status=405)
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "login_required"}, status=401)
+
+    try:
+        texts = json.loads(request.body or b"{}").get("texts")
+    except (ValueError, AttributeError):
+        texts = None
+    if not isinstance(texts, list) or not texts or not all(isinstance(t, str) for t in texts):
+        return JsonResponse({"error": "texts_required"}, status=400)
+    if len(texts) > MAX_BATCH_TEXTS or any(len(t) > MAX_TEXT_CHARS for t in texts):
+        return JsonResponse({"error": "too_long"}, status=413)
+
+    texts = [normalize_pasted_text(t) for t in texts]
+
+    try:
+        upload = client.files.create(
+            file=("correction_batch.jsonl", build_batch_jsonl(texts)),
+            purpose="batch",
+        )
+        remote = client.batches.create(
+            input_file_id=upload.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+    except Exception as e:
+        print("❌ OpenAI batch submit error:", e)
+        return JsonResponse({"error": "openai_unavailable"}, status=502)
+    batch = CorrectionBatch.objects.create(
+        user=request.user,
+        openai_batch_id=remote.id,
+        status=remote.status,
+        texts=texts,
+    )
+    return JsonResponse(batch_payload(batch), status=202)
+
+
+def batch_status(request, pk):
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "login_required"}, status=401)
+
+    batch = get_object_or_404(CorrectionBatch, pk=pk, user=request.user)
+    # Poll on read; the poll_correction_batches command does the same from cron
+    try:
+        batch = refresh_correction_batch(batch)
+    except Exception as e:
+        print("❌ OpenAI batch status error:", e)
+        return JsonResponse({"error": "openai_unavailable"}, status=502)
+    return JsonResponse(batch_payload(batch))
+
+
 # =================================================
 # AUTH (UNCHANGED LOGIC, SWEDISH MESSAGES)
 # =================================================
 from django.contrib.auth import login, authenticate, logout
 from django.contrib import messages
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
 
 
 def register(request):
@@ -802,17 +1695,19 @@ def register(request):
     password = request.POST.get("password")
     name = request.POST.get("name")
 
-    if User.objects.filter(username=email).exists():
+    # One INSERT; the unique username constraint rejects taken addresses (no exists() race)
+    try:
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username=email,
+                email=email,
+                password=password,
+                first_name=name,
+            )
+    except IntegrityError:
         messages.error(request, "E-postadressen används redan.")
         return redirect("/")
 
-    user = User.objects.create_user(
-        username=email,
-        email=email,
-        password=password,
-        first_name=name,
-    )
-
     login(request, user)
     return redirect("/")
 